@@ -0,0 +1,23 @@
+from openpyxl import Workbook
+
+from dreamai.excel.functions import (
+    write_arithmetic_operation,
+    write_conditional_formula,
+    write_math_function,
+    write_statistical_function,
+)
+
+excel_path = "formulas_demo.xlsx"
+
+# The writers edit an existing workbook, so create one first.
+wb = Workbook()
+wb.active.title = "Sheet1"
+wb.save(excel_path)
+
+sum_result = write_math_function(excel_path, "Sheet1", "A1", "SUM", ["1", "2", "3"])
+average_result = write_statistical_function(excel_path, "Sheet1", "A2", "AVERAGE", ["A1:A1"])
+conditional_result = write_conditional_formula(excel_path, "Sheet1", "A3", "A1>3", "1", "0")
+product_result = write_arithmetic_operation(excel_path, "Sheet1", "A4", "MULTIPLY", ["A1", "2"])
+
+for result in (sum_result, average_result, conditional_result, product_result):
+    print(result.to_dict())
@@ -0,0 +1,6 @@
+class FormulaError(Exception):
+    pass
+
+
+class FileOperationError(Exception):
+    pass
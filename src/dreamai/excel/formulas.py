@@ -0,0 +1,750 @@
+import functools
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+from xml.etree import ElementTree as ET
+
+from loguru import logger
+
+# Same backend seam as validation.py: prefer wolfxl's Rust-backed
+# load_workbook when installed, opt out with DREAMAI_EXCEL_BACKEND=openpyxl.
+if os.environ.get("DREAMAI_EXCEL_BACKEND", "wolfxl") == "openpyxl":
+    from openpyxl import load_workbook
+else:
+    try:
+        from wolfxl import load_workbook
+    except ImportError:
+        from openpyxl import load_workbook
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+
+from dreamai.excel.errors import FileOperationError, FormulaError
+
+MAX_FORMULA_LENGTH = 8192
+MAX_NESTING_DEPTH = 64
+MAX_OPERATORS = 100
+MAX_FUNCTIONS = 50
+MAX_STRING_LITERAL = 255
+MAX_ROWS = 1_048_576
+MAX_COLS = 16_384
+
+# Fast paths cover refs that are always in bounds (<= column ZZ, row 999999);
+# anything longer falls through to openpyxl for the real bounds check.
+_CELL_FULL = re.compile(r"\$?[A-Z]{1,2}\$?[1-9]\d{0,5}")
+_RANGE_FULL = re.compile(r"\$?([A-Z]{1,2})\$?([1-9]\d{0,5}):\$?([A-Z]{1,2})\$?([1-9]\d{0,5})")
+_CELL_TOKEN_RE = re.compile(r"\$?[A-Z]{1,3}\$?\d+")
+_RANGE_TOKEN_RE = re.compile(r"\$?[A-Z]{1,3}\$?\d+:\$?[A-Z]{1,3}\$?\d+")
+_OPERATOR_CHARS = frozenset("+-*/^&=<>")
+_ALLOWED_CHARS_TABLE = str.maketrans(
+    "", "", "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 +-*/^&=<>()[]{},.:;!$'\"%#?_@"
+)
+_VALID_FUNCTIONS = frozenset(
+    {
+        "SUM",
+        "AVERAGE",
+        "COUNT",
+        "COUNTA",
+        "COUNTIF",
+        "COUNTIFS",
+        "SUMIF",
+        "SUMIFS",
+        "MAX",
+        "MIN",
+        "MEDIAN",
+        "PRODUCT",
+        "ROUND",
+        "ROUNDUP",
+        "ROUNDDOWN",
+        "ABS",
+        "SQRT",
+        "POWER",
+        "MOD",
+        "INT",
+        "IF",
+        "IFERROR",
+        "AND",
+        "OR",
+        "NOT",
+        "VLOOKUP",
+        "HLOOKUP",
+        "INDEX",
+        "MATCH",
+        "CONCATENATE",
+        "LEFT",
+        "RIGHT",
+        "MID",
+        "LEN",
+        "TRIM",
+    }
+    # Logical / lookup / math / statistical / text / info functions emitted
+    # by dreamai.excel.functions.
+    | {"XOR", "IFNA", "TRUE", "FALSE"}
+    | {"LOOKUP", "CHOOSE", "OFFSET", "INDIRECT", "ROW", "COLUMN", "ROWS", "COLUMNS"}
+    | {
+        "ACOS",
+        "ASIN",
+        "ATAN",
+        "CEILING",
+        "COS",
+        "DEGREES",
+        "EXP",
+        "FLOOR",
+        "LN",
+        "LOG",
+        "LOG10",
+        "PI",
+        "RADIANS",
+        "RAND",
+        "RANDBETWEEN",
+        "SIGN",
+        "SIN",
+        "SUMPRODUCT",
+        "TAN",
+        "TRUNC",
+    }
+    | {
+        "AVERAGEIF",
+        "AVERAGEIFS",
+        "COUNTBLANK",
+        "LARGE",
+        "MODE",
+        "PERCENTILE",
+        "QUARTILE",
+        "RANK",
+        "SMALL",
+        "STDEV",
+        "VAR",
+    }
+    | {
+        "EXACT",
+        "FIND",
+        "LOWER",
+        "PROPER",
+        "REPLACE",
+        "REPT",
+        "SEARCH",
+        "SUBSTITUTE",
+        "TEXT",
+        "UPPER",
+        "VALUE",
+    }
+    | {
+        "CELL",
+        "INFO",
+        "ISBLANK",
+        "ISERR",
+        "ISERROR",
+        "ISEVEN",
+        "ISLOGICAL",
+        "ISNA",
+        "ISNONTEXT",
+        "ISNUMBER",
+        "ISODD",
+        "ISREF",
+        "ISTEXT",
+        "N",
+        "NA",
+        "TYPE",
+    }
+)
+_VALID_FUNCTIONS_SORTED = tuple(sorted(_VALID_FUNCTIONS))
+_FUNC_CALL_RE = re.compile(r"\b([A-Z][A-Z0-9]*)\(")
+_DIV_RES = (re.compile(r"/0\b"), re.compile(r"/COUNTIFS?\([^)]+\)"), re.compile(r"/COUNT\([^)]+\)"))
+_EXCEL_ERRORS = {
+    "#DIV/0!": "Division by zero",
+    "#N/A": "Value not available",
+    "#NAME?": "Unrecognized function or name",
+    "#NULL!": "Incorrect range intersection",
+    "#NUM!": "Invalid numeric value",
+    "#REF!": "Invalid cell reference",
+    "#VALUE!": "Wrong argument type",
+    "#SPILL!": "Spill range is blocked",
+    "#CALC!": "Calculation error",
+    "#GETTING_DATA": "Value still loading",
+    "#FIELD!": "Invalid field reference",
+}
+
+
+def _validate_string_literals(formula: str) -> None:
+    i = formula.find('"')
+    while i != -1:
+        j = formula.find('"', i + 1)
+        if j == -1:
+            raise FormulaError(f"Unterminated string literal starting at position {i}")
+        if j - i - 1 > MAX_STRING_LITERAL:
+            raise FormulaError(f"String literal exceeds {MAX_STRING_LITERAL} characters")
+        literal = formula[i + 1 : j]
+        if "\n" in literal or "\r" in literal:
+            raise FormulaError("String literals cannot contain line breaks")
+        i = formula.find('"', j + 1)
+
+
+_ILLEGAL_WS_CHARS = str.maketrans("", "", "[]:*?/\\")
+_RESERVED_WS = frozenset(
+    {"CON", "PRN", "AUX", "NUL"}
+    | {f"COM{i}" for i in range(1, 10)}
+    | {f"LPT{i}" for i in range(1, 10)}
+)
+
+
+def _validate_worksheet_references(formula: str) -> None:
+    for match in re.finditer(r"(?:'([^']+)'|([A-Za-z_][A-Za-z0-9_ ]*))!", formula):
+        worksheet_name = match.group(1) or match.group(2)
+        if len(worksheet_name.translate(_ILLEGAL_WS_CHARS)) != len(worksheet_name):
+            raise FormulaError(f"Worksheet name '{worksheet_name}' contains illegal characters")
+        if len(worksheet_name) > 31:
+            raise FormulaError(f"Worksheet name '{worksheet_name}' exceeds 31 characters")
+        if worksheet_name.upper() in _RESERVED_WS:
+            raise FormulaError(f"Worksheet name '{worksheet_name}' is a reserved name")
+
+
+def _check_date_parts(year: int, month: int, day: int) -> None:
+    if not 1900 <= year <= 9999:
+        raise FormulaError(f"Year {year} is outside the valid range 1900-9999")
+    if not 1 <= month <= 12:
+        raise FormulaError(f"Month {month} is outside the valid range 1-12")
+    if not 1 <= day <= 31:
+        raise FormulaError(f"Day {day} is outside the valid range 1-31")
+
+
+_DATE_RE = re.compile(
+    r'"[<>=]*(?:(?P<iso>(\d{4})-(\d{2})-(\d{2}))|(?P<us>(\d{1,2})/(\d{1,2})/(\d{4}))'
+    r'|(?P<alt>(\d{1,2})-(\d{1,2})-(\d{4})))"'
+)
+
+
+def _validate_date_formats(formula: str) -> None:
+    for match in _DATE_RE.finditer(formula):
+        groups = match.groups()
+        if groups[0] is not None:
+            _check_date_parts(int(groups[1]), int(groups[2]), int(groups[3]))
+        elif groups[4] is not None:
+            _check_date_parts(int(groups[7]), int(groups[5]), int(groups[6]))
+        else:
+            _check_date_parts(int(groups[11]), int(groups[9]), int(groups[10]))
+
+
+def _check_formula_complexity(formula: str) -> None:
+    op_count = sum(1 for char in formula if char in _OPERATOR_CHARS)
+    if op_count > MAX_OPERATORS:
+        raise FormulaError(f"Formula has {op_count} operators, maximum is {MAX_OPERATORS}")
+    func_count = sum(1 for _ in _FUNC_CALL_RE.finditer(formula))
+    if func_count > MAX_FUNCTIONS:
+        raise FormulaError(f"Formula has {func_count} function calls, maximum is {MAX_FUNCTIONS}")
+
+
+@functools.lru_cache(maxsize=4096)
+def _cell_reference_error(cell_ref: str) -> str | None:
+    if _CELL_FULL.fullmatch(cell_ref):
+        return None
+    try:
+        row, col = coordinate_to_tuple(cell_ref.replace("$", ""))
+    except Exception as e:
+        return f"Invalid cell reference '{cell_ref}': {e}"
+    if row > MAX_ROWS or col > MAX_COLS:
+        return f"Cell reference '{cell_ref}' is outside the worksheet bounds"
+    return None
+
+
+def _validate_cell_reference(cell_ref: str) -> None:
+    error = _cell_reference_error(cell_ref)
+    if error is not None:
+        raise FormulaError(error)
+
+
+@functools.lru_cache(maxsize=4096)
+def _range_reference_error(range_ref: str) -> str | None:
+    match = _RANGE_FULL.fullmatch(range_ref)
+    if match:
+        start_col, start_row, end_col, end_row = match.groups()
+        if (len(start_col), start_col) > (len(end_col), end_col):
+            return f"Range '{range_ref}' has start column after end column"
+        if int(start_row) > int(end_row):
+            return f"Range '{range_ref}' has start row after end row"
+        return None
+    try:
+        min_col, min_row, max_col, max_row = range_boundaries(range_ref.replace("$", ""))
+    except Exception as e:
+        return f"Invalid range reference '{range_ref}': {e}"
+    if min_col and max_col and min_col > max_col:
+        return f"Range '{range_ref}' has start column after end column"
+    if min_row and max_row and min_row > max_row:
+        return f"Range '{range_ref}' has start row after end row"
+    if (max_row or 0) > MAX_ROWS or (max_col or 0) > MAX_COLS:
+        return f"Range '{range_ref}' is outside the worksheet bounds"
+    return None
+
+
+def _validate_range_reference(range_ref: str) -> None:
+    error = _range_reference_error(range_ref)
+    if error is not None:
+        raise FormulaError(error)
+
+
+def _split_top_level_args(args_str: str) -> list[str] | None:
+    # Returns None when the text is not one call's argument list — depth
+    # going negative means the surrounding parens close early, as in
+    # "ROUND(1.5,0)*ROUND(2.5,0)" where the trailing paren is not the match
+    # for the leading one.
+    args = []
+    depth = 0
+    in_string = False
+    current = ""
+    for char in args_str:
+        if char == '"':
+            in_string = not in_string
+        elif not in_string:
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth < 0:
+                    return None
+            elif char == "," and depth == 0:
+                args.append(current.strip())
+                current = ""
+                continue
+        current += char
+    if current.strip():
+        args.append(current.strip())
+    return args
+
+
+def _require_args(function_name: str, args: list[Any]) -> None:
+    if not args:
+        raise FormulaError(f"{function_name} requires at least one argument")
+
+
+def _make_arity_validator(*counts: int) -> Callable[[str, list[Any]], None]:
+    expected = counts
+
+    def validator(function_name: str, args: list[Any]) -> None:
+        if len(args) not in expected:
+            wanted = " or ".join(str(count) for count in expected)
+            raise FormulaError(f"{function_name} requires {wanted} arguments, got {len(args)}")
+
+    return validator
+
+
+_TWO_OR_THREE_ARGS = _make_arity_validator(2, 3)
+_ARG_VALIDATORS: dict[str, Callable[[str, list[Any]], None]] = {
+    "SUM": _require_args,
+    "AVERAGE": _require_args,
+    "COUNT": _require_args,
+    "COUNTA": _require_args,
+    "MAX": _require_args,
+    "MIN": _require_args,
+    "MEDIAN": _require_args,
+    "PRODUCT": _require_args,
+    "CONCATENATE": _require_args,
+    "IF": _TWO_OR_THREE_ARGS,
+    "INDEX": _TWO_OR_THREE_ARGS,
+    "MATCH": _TWO_OR_THREE_ARGS,
+    "SUMIF": _TWO_OR_THREE_ARGS,
+    "VLOOKUP": _make_arity_validator(3, 4),
+    "HLOOKUP": _make_arity_validator(3, 4),
+    "ROUND": _make_arity_validator(2),
+    "ROUNDUP": _make_arity_validator(2),
+    "ROUNDDOWN": _make_arity_validator(2),
+    "POWER": _make_arity_validator(2),
+    "MOD": _make_arity_validator(2),
+    "COUNTIF": _make_arity_validator(2),
+    "LEFT": _make_arity_validator(1, 2),
+    "RIGHT": _make_arity_validator(1, 2),
+}
+
+
+def _validate_function_arguments(function_name: str, args: list[Any]) -> None:
+    validator = _ARG_VALIDATORS.get(function_name)
+    if validator is not None:
+        validator(function_name, args)
+
+
+_LAST_OK: ContextVar[str | None] = ContextVar("_LAST_OK", default=None)
+
+
+@functools.lru_cache(maxsize=4096)
+def _formula_syntax_error(formula: str) -> str | None:
+    try:
+        _validate_formula_syntax_impl(formula)
+    except FormulaError as e:
+        return str(e)
+    return None
+
+
+def _validate_formula_syntax(formula: str) -> None:
+    if formula == _LAST_OK.get():
+        return
+    error = _formula_syntax_error(formula)
+    if error is not None:
+        raise FormulaError(error)
+    _LAST_OK.set(formula)
+
+
+def _validate_formula_syntax_impl(formula: str) -> None:
+    if not formula:
+        raise FormulaError("Formula is empty")
+    if len(formula) > MAX_FORMULA_LENGTH:
+        raise FormulaError(f"Formula exceeds {MAX_FORMULA_LENGTH} characters")
+    if '"' not in formula:
+        # Quote-free formulas can be pre-rejected with two C-level scans
+        # before paying for the tokenizer; quoted literals may legally
+        # contain parens and arbitrary characters, so they skip this.
+        open_parens = formula.count("(")
+        close_parens = formula.count(")")
+        if open_parens != close_parens:
+            raise FormulaError(f"Unbalanced parentheses: {open_parens} opening, {close_parens} closing")
+        leftover = formula.translate(_ALLOWED_CHARS_TABLE)
+        if leftover:
+            raise FormulaError(f"Formula contains invalid characters: {leftover!r}")
+    _validate_string_literals(formula)
+    _validate_worksheet_references(formula)
+    _validate_date_formats(formula)
+    _check_formula_complexity(formula)
+    try:
+        tokenizer = Tokenizer("=" + formula)
+    except Exception as e:
+        raise FormulaError(f"Could not tokenize formula: {e}")
+    depth = 0
+    for token in tokenizer.items:
+        if token.type in (Token.FUNC, Token.PAREN):
+            if token.subtype == Token.OPEN:
+                depth += 1
+                if depth > MAX_NESTING_DEPTH:
+                    raise FormulaError(
+                        f"Formula nesting depth exceeds maximum of {MAX_NESTING_DEPTH}"
+                    )
+            elif token.subtype == Token.CLOSE:
+                depth -= 1
+                if depth < 0:
+                    raise FormulaError("Unbalanced parentheses: closing paren without matching open")
+        elif token.type == Token.OPERAND and token.subtype == Token.RANGE:
+            ref = token.value.rsplit("!", 1)[-1]
+            if ":" in ref:
+                if _RANGE_TOKEN_RE.fullmatch(ref):
+                    _validate_range_reference(ref)
+            elif _CELL_TOKEN_RE.fullmatch(ref):
+                _validate_cell_reference(ref)
+    if depth != 0:
+        raise FormulaError(f"Unbalanced parentheses: {depth} unclosed opening paren(s)")
+
+
+_SHEET_ML_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_RELS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+ET.register_namespace("", _SHEET_ML_NS)
+
+
+def _sheet_xml_member(zf: zipfile.ZipFile, sheet_name: str) -> str | None:
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    rel_targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+    for sheet in workbook.iter(f"{{{_SHEET_ML_NS}}}sheet"):
+        if sheet.get("name") == sheet_name:
+            target = rel_targets.get(sheet.get(f"{{{_RELS_NS}}}id"))
+            if target:
+                # openpyxl writes absolute part names ("/xl/worksheets/sheet1.xml");
+                # strip the leading slash and only prefix "xl/" for relative targets.
+                member = target.lstrip("/")
+                return member if member.startswith("xl/") else f"xl/{member}"
+    return None
+
+
+def _shared_string(zf: zipfile.ZipFile, index: int) -> str:
+    shared = ET.fromstring(zf.read("xl/sharedStrings.xml"))
+    item = list(shared)[index]
+    return "".join(t.text or "" for t in item.iter(f"{{{_SHEET_ML_NS}}}t"))
+
+
+def _read_cached_value(excel_path: str | Path, sheet_name: str, cell_ref: str) -> Any:
+    with zipfile.ZipFile(excel_path) as zf:
+        member = _sheet_xml_member(zf, sheet_name)
+        if member is None:
+            return None
+        root = ET.fromstring(zf.read(member))
+        for cell in root.iter(f"{{{_SHEET_ML_NS}}}c"):
+            if cell.get("r") != cell_ref:
+                continue
+            v = cell.find(f"{{{_SHEET_ML_NS}}}v")
+            if v is None or v.text is None:
+                return None
+            cell_type = cell.get("t")
+            if cell_type == "s":
+                return _shared_string(zf, int(v.text))
+            if cell_type in ("str", "e", "inlineStr"):
+                return v.text
+            try:
+                return int(v.text)
+            except ValueError:
+                try:
+                    return float(v.text)
+                except ValueError:
+                    return v.text
+    return None
+
+
+def _patch_cached_value(
+    excel_path: str | Path, sheet_name: str, cell_ref: str, value: Any, is_str: bool = False
+) -> None:
+    excel_path = Path(excel_path)
+    with zipfile.ZipFile(excel_path) as zf:
+        member = _sheet_xml_member(zf, sheet_name)
+        if member is None:
+            raise FormulaError(f"Sheet '{sheet_name}' not found in {excel_path}")
+        root = ET.fromstring(zf.read(member))
+        target = None
+        for cell in root.iter(f"{{{_SHEET_ML_NS}}}c"):
+            if cell.get("r") == cell_ref:
+                target = cell
+                break
+        if target is None:
+            raise FormulaError(f"Cell '{cell_ref}' not found in sheet '{sheet_name}'")
+        v = target.find(f"{{{_SHEET_ML_NS}}}v")
+        if v is None:
+            v = ET.SubElement(target, f"{{{_SHEET_ML_NS}}}v")
+        v.text = str(value)
+        if is_str:
+            target.set("t", "str")
+        patched = ET.tostring(root, xml_declaration=True, encoding="UTF-8")
+        fd, tmp_name = tempfile.mkstemp(dir=excel_path.parent, suffix=".xlsx")
+        os.close(fd)
+        with zipfile.ZipFile(tmp_name, "w", zipfile.ZIP_DEFLATED) as out:
+            for item in zf.infolist():
+                out.writestr(item, patched if item.filename == member else zf.read(item.filename))
+    shutil.move(tmp_name, excel_path)
+    _WB_VALUES_CACHE.pop(str(excel_path), None)
+    _WB_CACHE.pop(str(excel_path), None)
+
+
+_WB_VALUES_CACHE: dict[str, tuple[int, Any]] = {}
+_WB_VALUES_CACHE_SIZE = 8
+
+
+def _load_values_workbook(excel_path: Path):
+    key = str(excel_path)
+    mtime = excel_path.stat().st_mtime_ns
+    cached = _WB_VALUES_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    wb = load_workbook(excel_path, data_only=True)
+    if len(_WB_VALUES_CACHE) >= _WB_VALUES_CACHE_SIZE:
+        _WB_VALUES_CACHE.pop(next(iter(_WB_VALUES_CACHE)))
+    _WB_VALUES_CACHE[key] = (mtime, wb)
+    return wb
+
+
+_WB_CACHE_SIZE = 8
+_WB_CACHE: dict[str, tuple[int, Any]] = {}
+
+
+def _get_wb(excel_path: Path):
+    key = str(excel_path)
+    mtime = excel_path.stat().st_mtime_ns
+    cached = _WB_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    wb = load_workbook(excel_path)
+    if len(_WB_CACHE) >= _WB_CACHE_SIZE:
+        _WB_CACHE.pop(next(iter(_WB_CACHE)))
+    _WB_CACHE[key] = (mtime, wb)
+    return wb
+
+
+_SESSION_LOCAL = threading.local()
+
+
+def _buffered_save(wb: Any, excel_path: str | Path) -> None:
+    # Workbook.save accepts a file object; a 256 KiB buffer beats the 8 KiB
+    # default considerably for the XML write path.
+    with open(excel_path, "wb", buffering=1 << 18) as fh:
+        wb.save(fh)
+
+
+def _save_wb(wb: Any, excel_path: Path) -> None:
+    session = getattr(_SESSION_LOCAL, "active", None)
+    if session is not None:
+        session._defer(wb, excel_path)
+        return
+    _buffered_save(wb, excel_path)
+    _WB_CACHE[str(excel_path)] = (excel_path.stat().st_mtime_ns, wb)
+
+
+class WorkbookSession:
+    # Defers saves while active: writes keep mutating the cached Workbook
+    # objects and each dirty workbook is serialized once, on exit or when
+    # evicted. Cached cell values read from disk lag until the flush.
+    def __init__(self, max_open: int = 4):
+        self.max_open = max_open
+        self._dirty: dict[str, tuple[Path, Any]] = {}
+
+    def _defer(self, wb: Any, excel_path: Path) -> None:
+        key = str(excel_path)
+        if key not in self._dirty and len(self._dirty) >= self.max_open:
+            self._flush_one(next(iter(self._dirty)))
+        self._dirty[key] = (excel_path, wb)
+
+    def _flush_one(self, key: str) -> None:
+        excel_path, wb = self._dirty.pop(key)
+        _buffered_save(wb, excel_path)
+        _WB_CACHE[key] = (excel_path.stat().st_mtime_ns, wb)
+
+    def flush(self) -> None:
+        for key in list(self._dirty):
+            self._flush_one(key)
+
+    def __enter__(self) -> "WorkbookSession":
+        _SESSION_LOCAL.active = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _SESSION_LOCAL.active = None
+        if exc_type is None:
+            self.flush()
+        else:
+            # Unsaved mutations make the cached workbooks unusable; drop them
+            # so the next access reloads from disk.
+            for key in self._dirty:
+                _WB_CACHE.pop(key, None)
+            self._dirty.clear()
+        return False
+
+
+def _write_formula(excel_path: str | Path, sheet_name: str, cell_ref: str, formula: str) -> tuple[Any, Path]:
+    excel_path = Path(excel_path)
+    if not excel_path.exists():
+        raise FileOperationError(f"Excel file not found: {excel_path}")
+    wb = _get_wb(excel_path)
+    if sheet_name not in wb.sheetnames:
+        raise FormulaError(f"Sheet '{sheet_name}' not found. Available sheets: {wb.sheetnames}")
+    if not formula.startswith("="):
+        formula = "=" + formula
+    wb[sheet_name][cell_ref] = formula
+    _save_wb(wb, excel_path)
+    return wb, excel_path
+
+
+def _run_preflight_checks(cell_ref: str, formula_content: str) -> None:
+    _validate_cell_reference(cell_ref)
+    _validate_formula_syntax(formula_content)
+    if "(" in formula_content:
+        for match in _FUNC_CALL_RE.finditer(formula_content):
+            name = match.group(1)
+            if name not in _VALID_FUNCTIONS:
+                raise FormulaError(
+                    f"Unknown function '{name}'. Valid functions: {list(_VALID_FUNCTIONS_SORTED)}"
+                )
+    if (
+        "/" in formula_content
+        and not formula_content.startswith("IFERROR(")
+        and any(regex.search(formula_content) for regex in _DIV_RES)
+    ):
+        raise FormulaError("Formula may divide by zero. Wrap it in IFERROR(...) to handle that case")
+    outer_match = re.match(r"^([A-Z][A-Z0-9]*)\((.*)\)$", formula_content)
+    if outer_match:
+        # The regex is greedy, so compound formulas like ROUND(..)*ROUND(..)
+        # also match; the splitter returns None for those and arity is not
+        # checked.
+        args = _split_top_level_args(outer_match.group(2))
+        if args is not None:
+            _validate_function_arguments(outer_match.group(1), args)
+
+
+class FormulaResult(NamedTuple):
+    success: bool
+    value: Any
+    error: str | None
+    formula: str
+
+    def to_dict(self) -> dict[str, Any]:
+        return self._asdict()
+
+
+def write_and_evaluate_formula(
+    excel_path: str | Path, sheet_name: str, cell_ref: str, formula: str
+) -> FormulaResult:
+    formula_content = formula[1:] if formula.startswith("=") else formula
+    _run_preflight_checks(cell_ref, formula_content)
+    wb, path = _write_formula(excel_path, sheet_name, cell_ref, formula_content)
+    written_formula = wb[sheet_name][cell_ref].value
+    value = _read_cached_value(path, sheet_name, cell_ref)
+    if isinstance(value, str) and value in _EXCEL_ERRORS:
+        return FormulaResult(False, value, _EXCEL_ERRORS[value], written_formula)
+    return FormulaResult(True, value, None, written_formula)
+
+
+def _write_formulas_new(excel_path: Path, prepared: list[tuple[str, str, str]]) -> list[FormulaResult]:
+    # Write-only workbooks stream rows SAX-style and never build the
+    # in-memory cell tree, but rows can only be appended in order, so the
+    # entries are laid out into a sparse per-sheet grid first.
+    from openpyxl import Workbook
+
+    by_sheet: dict[str, dict[int, dict[int, str]]] = {}
+    for sheet_name, cell_ref, formula_content in prepared:
+        row, col = coordinate_to_tuple(cell_ref)
+        by_sheet.setdefault(sheet_name, {}).setdefault(row, {})[col] = "=" + formula_content
+    wb = Workbook(write_only=True)
+    for sheet_name, rows in by_sheet.items():
+        ws = wb.create_sheet(sheet_name)
+        for ridx in range(1, max(rows) + 1):
+            cols = rows.get(ridx)
+            if cols is None:
+                ws.append([])
+            else:
+                ws.append([cols.get(cidx) for cidx in range(1, max(cols) + 1)])
+    _buffered_save(wb, excel_path)
+    # A fresh file has no cached values to read back.
+    return [FormulaResult(True, None, None, "=" + content) for _, _, content in prepared]
+
+
+def write_formulas_bulk(
+    excel_path: str | Path, entries: list[tuple[str, str, str]]
+) -> list[FormulaResult]:
+    excel_path = Path(excel_path)
+    prepared = []
+    for sheet_name, cell_ref, formula in entries:
+        formula_content = formula[1:] if formula.startswith("=") else formula
+        _run_preflight_checks(cell_ref, formula_content)
+        prepared.append((sheet_name, cell_ref, formula_content))
+    if not excel_path.exists():
+        return _write_formulas_new(excel_path, prepared)
+    wb = _get_wb(excel_path)
+    for sheet_name, cell_ref, formula_content in prepared:
+        if sheet_name not in wb.sheetnames:
+            raise FormulaError(f"Sheet '{sheet_name}' not found. Available sheets: {wb.sheetnames}")
+        wb[sheet_name][cell_ref] = "=" + formula_content
+    _save_wb(wb, excel_path)
+    wb_values = _load_values_workbook(excel_path)
+    results = []
+    for sheet_name, cell_ref, formula_content in prepared:
+        value = wb_values[sheet_name][cell_ref].value
+        written_formula = wb[sheet_name][cell_ref].value
+        if isinstance(value, str) and value in _EXCEL_ERRORS:
+            results.append(FormulaResult(False, value, _EXCEL_ERRORS[value], written_formula))
+        else:
+            results.append(FormulaResult(True, value, None, written_formula))
+    return results
+
+
+def write_formula_with_error_handling(
+    excel_path: str | Path, sheet_name: str, cell_ref: str, formula: str, max_retries: int = 3
+) -> FormulaResult:
+    last_error = ""
+    for attempt in range(1, max_retries + 1):
+        try:
+            return write_and_evaluate_formula(excel_path, sheet_name, cell_ref, formula)
+        except FormulaError as e:
+            last_error = str(e)
+            logger.warning(f"Formula attempt {attempt}/{max_retries} failed: {e}")
+            open_parens = formula.count("(")
+            close_parens = formula.count(")")
+            if open_parens > close_parens:
+                formula += ")" * (open_parens - close_parens)
+        except Exception as e:
+            last_error = str(e)
+            logger.warning(f"Formula attempt {attempt}/{max_retries} failed: {e}")
+    return FormulaResult(False, None, last_error, formula)
@@ -0,0 +1,552 @@
+import io
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, wraps
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable
+
+from dreamai.excel.errors import FileOperationError, FormulaError
+from dreamai.excel.formulas import (
+    FormulaResult,
+    _SESSION_LOCAL,
+    _patch_cached_value,
+    _validate_cell_reference,
+    _validate_range_reference,
+    write_and_evaluate_formula,
+    write_formulas_bulk,
+)
+
+
+_LOGICAL_FNS = frozenset({"IF", "AND", "OR", "NOT", "XOR", "IFERROR", "IFNA", "TRUE", "FALSE"})
+_LOGICAL_NO_PARAM = frozenset({"TRUE", "FALSE"})
+_LOOKUP_FNS = frozenset(
+    {
+        "VLOOKUP",
+        "HLOOKUP",
+        "INDEX",
+        "MATCH",
+        "LOOKUP",
+        "CHOOSE",
+        "OFFSET",
+        "INDIRECT",
+        "ROW",
+        "COLUMN",
+        "ROWS",
+        "COLUMNS",
+    }
+)
+_LOOKUP_NO_PARAM = frozenset({"ROW", "COLUMN"})
+_MATH_FNS = frozenset(
+    {
+        "ABS",
+        "ACOS",
+        "ASIN",
+        "ATAN",
+        "CEILING",
+        "COS",
+        "DEGREES",
+        "EXP",
+        "FLOOR",
+        "INT",
+        "LN",
+        "LOG",
+        "LOG10",
+        "MOD",
+        "PI",
+        "POWER",
+        "PRODUCT",
+        "RADIANS",
+        "RAND",
+        "RANDBETWEEN",
+        "ROUND",
+        "ROUNDDOWN",
+        "ROUNDUP",
+        "SIGN",
+        "SIN",
+        "SQRT",
+        "SUM",
+        "SUMIF",
+        "SUMIFS",
+        "SUMPRODUCT",
+        "TAN",
+        "TRUNC",
+    }
+)
+_MATH_NO_PARAM = frozenset({"PI", "RAND"})
+_STAT_FNS = frozenset(
+    {
+        "AVERAGE",
+        "AVERAGEIF",
+        "AVERAGEIFS",
+        "COUNT",
+        "COUNTA",
+        "COUNTBLANK",
+        "COUNTIF",
+        "COUNTIFS",
+        "LARGE",
+        "MAX",
+        "MEDIAN",
+        "MIN",
+        "MODE",
+        "PERCENTILE",
+        "QUARTILE",
+        "RANK",
+        "SMALL",
+        "STDEV",
+        "VAR",
+    }
+)
+_TEXT_FNS = frozenset(
+    {
+        "CONCATENATE",
+        "EXACT",
+        "FIND",
+        "LEFT",
+        "LEN",
+        "LOWER",
+        "MID",
+        "PROPER",
+        "REPLACE",
+        "REPT",
+        "RIGHT",
+        "SEARCH",
+        "SUBSTITUTE",
+        "TEXT",
+        "TRIM",
+        "UPPER",
+        "VALUE",
+    }
+)
+_INFO_FNS = frozenset(
+    {
+        "CELL",
+        "INFO",
+        "ISBLANK",
+        "ISERR",
+        "ISERROR",
+        "ISEVEN",
+        "ISLOGICAL",
+        "ISNA",
+        "ISNONTEXT",
+        "ISNUMBER",
+        "ISODD",
+        "ISREF",
+        "ISTEXT",
+        "N",
+        "NA",
+        "TYPE",
+    }
+)
+_INFO_NO_PARAM = frozenset({"NA"})
+
+_OPERAND_CLS_RE = re.compile(r"(?P<cell>[A-Z]+\d+)$|(?P<range>[A-Z]+\d*:[A-Z]+\d*)$")
+_CELL_RE = re.compile(r"^\$?[A-Z]{1,3}\$?[1-9]\d{0,6}$")
+_OP_JOINERS = {"ADD": "+", "MULTIPLY": "*"}
+# Non-commutative ops: (separator, joiner for the grouped tail).
+_OP_SUBDIV = {"SUBTRACT": ("-", "+"), "DIVIDE": ("/", "*")}
+_ARITH_OPS = frozenset({"ADD", "SUBTRACT", "MULTIPLY", "DIVIDE", "POWER"})
+_CMP_OPS = frozenset({"=", "<", ">", "<=", ">=", "<>"})
+_NUMERIC_EXPR_RE = re.compile(r"^\(?-?\d+(?:\.\d+)?(?:[+\-*/^]\(?-?\d+(?:\.\d+)?\)?)+$")
+# Unary minus directly on the base of ^: the one place Excel (-2^2 = 4) and
+# Python (-2**2 = -4) disagree on precedence.
+_UNARY_NEG_BASE_RE = re.compile(r"(?:^|[+\-*/^(])-[\d.]+\^")
+_EXPONENT_RE = re.compile(r"\^\(?-?(\d+(?:\.\d+)?)")
+_MAX_EXPONENT = 1024.0
+# Bound .format methods: no per-call attribute lookup in tight loops.
+_IF_FMT = "IF({},{},{})".format
+_CMP_FMT = "{}{}{}".format
+
+
+def _try_fast_eval(formula: str) -> float | None:
+    if not _NUMERIC_EXPR_RE.match(formula) or formula.count("(") != formula.count(")"):
+        return None
+    if "^" in formula:
+        # Caching a wrong value is worse than skipping the shortcut: fall
+        # back on negated bases (precedence mismatch) and on chained or
+        # oversized exponents, which would make eval grind through
+        # astronomically large integers.
+        if formula.count("^") > 1 or _UNARY_NEG_BASE_RE.search(formula):
+            return None
+        exponent = _EXPONENT_RE.search(formula)
+        if exponent is None or float(exponent.group(1)) > _MAX_EXPONENT:
+            return None
+    try:
+        value = eval(compile(formula.replace("^", "**"), "<formula>", "eval"), {"__builtins__": {}})
+        float(value)  # OverflowError for results beyond float range
+        return value
+    except (ZeroDivisionError, OverflowError, SyntaxError, ValueError):
+        return None
+
+
+def _write_with_fast_eval(
+    excel_path: str | Path, sheet_name: str, cell_ref: str, formula: str
+) -> FormulaResult:
+    value = _try_fast_eval(formula)
+    result = write_and_evaluate_formula(excel_path, sheet_name, cell_ref, formula)
+    if value is not None and result.success and result.value is None:
+        # Inside a WorkbookSession the save is deferred, so there is no
+        # on-disk zip to patch yet; the caller still gets the computed value.
+        if getattr(_SESSION_LOCAL, "active", None) is None:
+            _patch_cached_value(excel_path, sheet_name, cell_ref, value)
+        result = result._replace(value=value)
+    return result
+
+
+def _make_emitter(prefix: str) -> Callable[[list[Any]], str]:
+    # The open-paren is baked into the closure so the hot path is one join
+    # and one concat with no name validation or dict lookups.
+    def emit(function_args: list[Any]) -> str:
+        if len(function_args) == 1:
+            return prefix + str(function_args[0]) + ")"
+        # Cell references arrive as str already; type() is str skips the
+        # isinstance MRO walk.
+        if all(type(item) is str for item in function_args):
+            return prefix + ",".join(function_args) + ")"
+        return prefix + ",".join(map(str, function_args)) + ")"
+
+    return emit
+
+
+def _build_call(name: str, args: list[str]) -> str:
+    if len(args) < 32:
+        return f"{name}({','.join(args)})"
+    # Long calls (COUNTIFS with many criteria, deep nesting) grow in one
+    # buffer instead of through mid-size intermediate strings.
+    buf = io.StringIO()
+    buf.write(name)
+    buf.write("(")
+    buf.write(args[0])
+    for arg in args[1:]:
+        buf.write(",")
+        buf.write(arg)
+    buf.write(")")
+    return buf.getvalue()
+
+
+def _build_formula(function_name: str, function_args: list[Any]) -> str:
+    emitter = _EMITTERS.get(function_name)
+    if emitter is not None:
+        return emitter(function_args)
+    if len(function_args) == 1:
+        return "%s(%s)" % (function_name, function_args[0])
+    if all(type(item) is str for item in function_args):
+        return "%s(%s)" % (function_name, ",".join(function_args))
+    return "%s(%s)" % (function_name, ",".join(map(str, function_args)))
+
+
+_CATEGORIES: dict[str, tuple[frozenset[str], frozenset[str], tuple[str, ...]]] = {
+    "logical": (_LOGICAL_FNS, _LOGICAL_NO_PARAM, tuple(sorted(_LOGICAL_FNS))),
+    "lookup": (_LOOKUP_FNS, _LOOKUP_NO_PARAM, tuple(sorted(_LOOKUP_FNS))),
+    "math": (_MATH_FNS, _MATH_NO_PARAM, tuple(sorted(_MATH_FNS))),
+    "statistical": (_STAT_FNS, frozenset(), tuple(sorted(_STAT_FNS))),
+    "text": (_TEXT_FNS, frozenset(), tuple(sorted(_TEXT_FNS))),
+    "info": (_INFO_FNS, _INFO_NO_PARAM, tuple(sorted(_INFO_FNS))),
+}
+_ARITH_OPS_SORTED = tuple(sorted(_ARITH_OPS))
+_CMP_OPS_SORTED = tuple(sorted(_CMP_OPS))
+_ALL_FNS = frozenset().union(*(fns for fns, _, _ in _CATEGORIES.values()))
+_EMITTERS: dict[str, Callable[[list[Any]], str]] = {name: _make_emitter(name + "(") for name in _ALL_FNS}
+
+
+def _wrap_errors(kind: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return func(*args, **kwargs)
+            except FormulaError:
+                raise
+            except Exception as e:
+                raise FileOperationError(f"Failed to write {kind}: {e}")
+
+        return wrapper
+
+    return decorator
+
+
+def _make_writer(category: str) -> Callable[..., FormulaResult]:
+    # The category's sets are closed over, so each writer skips the table
+    # lookup and partial indirection on every call.
+    valid_functions, no_param_functions, valid_sorted = _CATEGORIES[category]
+
+    @_wrap_errors(f"{category} function")
+    def writer(
+        excel_path: str | Path,
+        sheet_name: str,
+        cell_ref: str,
+        function_name: str,
+        function_args: list[Any] | None = None,
+    ) -> FormulaResult:
+        # Hash lookup first: the common uppercase input hits the set directly
+        # and never pays for .upper().
+        if function_name not in valid_functions:
+            function_name = function_name.upper()
+            if function_name not in valid_functions:
+                raise FormulaError(
+                    f"Invalid {category} function '{function_name}'. Valid functions: {list(valid_sorted)}"
+                )
+        if not function_args:
+            if function_name not in no_param_functions:
+                raise FormulaError(f"{function_name} requires at least one argument")
+            formula = f"{function_name}()"
+        else:
+            formula = _build_formula(function_name, function_args)
+        return write_and_evaluate_formula(excel_path, sheet_name, cell_ref, formula)
+
+    return writer
+
+
+write_logical = _make_writer("logical")
+write_lookup_function = _make_writer("lookup")
+write_math_function = _make_writer("math")
+write_statistical_function = _make_writer("statistical")
+write_text_function = _make_writer("text")
+write_info_function = _make_writer("info")
+
+
+@_wrap_errors("arithmetic operation")
+def write_arithmetic_operation(
+    excel_path: str | Path, sheet_name: str, cell_ref: str, operation: str, operands: list[str]
+) -> FormulaResult:
+    if operation not in _ARITH_OPS:
+        operation = operation.upper()
+        if operation not in _ARITH_OPS:
+            raise FormulaError(
+                f"Invalid operation '{operation}'. Valid operations: {list(_ARITH_OPS_SORTED)}"
+            )
+    if len(operands) < 2:
+        raise FormulaError("Arithmetic operations require at least two operands")
+    # Normalize into a copy; the caller's list is left untouched.
+    normalized: list[str] = []
+    for operand in operands:
+        stripped = operand.strip()
+        match = _OPERAND_CLS_RE.match(stripped)
+        if match:
+            if match.lastgroup == "cell":
+                _validate_cell_reference(match.group())
+            else:
+                _validate_range_reference(match.group())
+            normalized.append(stripped)
+        else:
+            normalized.append(operand)
+    operands = normalized
+    joiner = _OP_JOINERS.get(operation)
+    if joiner is not None:
+        if len(operands) >= 3:
+            # Same numeric result, but Excel recalculates SUM/PRODUCT through
+            # its internal accumulator instead of a left-deep operator chain.
+            formula = ("SUM(" if operation == "ADD" else "PRODUCT(") + ",".join(operands) + ")"
+        else:
+            formula = joiner.join(operands)
+    elif operation == "POWER":
+        if len(operands) != 2:
+            raise FormulaError("POWER requires exactly two operands")
+        formula = f"POWER({operands[0]},{operands[1]})"
+    else:
+        separator, group_joiner = _OP_SUBDIV[operation]
+        if len(operands) > 2:
+            formula = f"{operands[0]}{separator}({group_joiner.join(operands[1:])})"
+        else:
+            formula = f"{operands[0]}{separator}{operands[1]}"
+    return _write_with_fast_eval(excel_path, sheet_name, cell_ref, formula)
+
+
+@_wrap_errors("comparison operation")
+def write_comparison_operation(
+    excel_path: str | Path,
+    sheet_name: str,
+    cell_ref: str,
+    left_operand: str,
+    operator: str,
+    right_operand: str,
+) -> FormulaResult:
+    if operator not in _CMP_OPS:
+        raise FormulaError(f"Invalid operator '{operator}'. Valid operators: {list(_CMP_OPS_SORTED)}")
+    formula = _CMP_FMT(left_operand, operator, right_operand)
+    return write_and_evaluate_formula(excel_path, sheet_name, cell_ref, formula)
+
+
+@_wrap_errors("nested function")
+def write_nested_function(
+    excel_path: str | Path,
+    sheet_name: str,
+    cell_ref: str,
+    outer_function: str,
+    inner_functions: list[str],
+    outer_args: list[str] | None = None,
+) -> FormulaResult:
+    if not inner_functions:
+        raise FormulaError("Nested functions require at least one inner function")
+    if not outer_function.isupper():
+        outer_function = outer_function.upper()
+    formula = _build_call(outer_function, list(chain(inner_functions, outer_args or ())))
+    return write_and_evaluate_formula(excel_path, sheet_name, cell_ref, formula)
+
+
+@lru_cache(maxsize=4096)
+def _if_template(condition: str, true_value: str, false_value: str) -> str:
+    return _IF_FMT(condition, true_value, false_value)
+
+
+@_wrap_errors("conditional formula")
+def write_conditional_formula(
+    excel_path: str | Path, sheet_name: str, cell_ref: str, condition: str, true_value: str, false_value: str
+) -> FormulaResult:
+    formula = _if_template(condition, true_value, false_value)
+    return _write_with_fast_eval(excel_path, sheet_name, cell_ref, formula)
+
+
+@lru_cache(maxsize=4096)
+def _build_countifs(range_criteria_pairs: tuple[tuple[str, str], ...]) -> str:
+    if len(range_criteria_pairs) < 16:
+        return "COUNTIFS(" + ",".join(chain.from_iterable(range_criteria_pairs)) + ")"
+    return _build_call("COUNTIFS", list(chain.from_iterable(range_criteria_pairs)))
+
+
+def build_countifs_expression(range_criteria_pairs: list[tuple[str, str]] | tuple[tuple[str, str], ...]) -> str:
+    if not range_criteria_pairs:
+        raise FormulaError("COUNTIFS requires at least one range/criteria pair")
+    if type(range_criteria_pairs) is not tuple:
+        range_criteria_pairs = tuple(map(tuple, range_criteria_pairs))
+    return _build_countifs(range_criteria_pairs)
+
+
+@lru_cache(maxsize=4096)
+def build_division_expression(numerator: str, denominator: str, iferror_default: str | None = None) -> str:
+    expression = f"{numerator}/{denominator}"
+    if iferror_default is not None:
+        return f"IFERROR({expression},{iferror_default})"
+    return expression
+
+
+def build_formulas_bulk(function_name: str, arg_columns: list[list[Any]]) -> list[str]:
+    if not arg_columns:
+        raise FormulaError("build_formulas_bulk requires at least one argument column")
+    if not function_name.isupper():
+        function_name = function_name.upper()
+    prefix = function_name + "("
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return [prefix + ",".join(map(str, row)) + ")" for row in zip(*arg_columns)]
+    columns = [pa.array([str(item) for item in column], type=pa.string()) for column in arg_columns]
+    joined = columns[0] if len(columns) == 1 else pc.binary_join_element_wise(*columns, ",")
+    return pc.binary_join_element_wise(prefix, joined, ")", "").to_pylist()
+
+
+def write_formulas_batch(
+    excel_path: str | Path, items: list[tuple[str, str, str]] | list[tuple[str, str, str, list[Any]]]
+) -> list[FormulaResult]:
+    # Entries are either (sheet, cell, formula) or (sheet, cell, function_name,
+    # function_args); construction is pure string work, so the workbook is
+    # still opened and saved exactly once by the bulk writer.
+    entries: list[tuple[str, str, str]] = []
+    for item in items:
+        if not _CELL_RE.match(item[1]):
+            raise FormulaError(f"Invalid cell reference '{item[1]}'")
+        if len(item) == 3:
+            entries.append(item)
+            continue
+        sheet_name, cell_ref, function_name, function_args = item
+        if function_name not in _ALL_FNS:
+            function_name = function_name.upper()
+            if function_name not in _ALL_FNS:
+                raise FormulaError(f"Invalid function '{function_name}'")
+        entries.append((sheet_name, cell_ref, _build_formula(function_name, function_args)))
+    return write_formulas_bulk(excel_path, entries)
+
+
+def _apply_entries_to_file(item: tuple[str, list[Any]]) -> list[FormulaResult]:
+    excel_path, entries = item
+    return write_formulas_batch(excel_path, entries)
+
+
+def write_formulas_many_files(per_file_entries: dict[str, list[Any]]) -> dict[str, list[FormulaResult]]:
+    # Each file's entries stay in one worker, so a workbook is only ever
+    # touched by a single process; a lone file skips the pool.
+    if len(per_file_entries) == 1:
+        excel_path, entries = next(iter(per_file_entries.items()))
+        return {excel_path: write_formulas_batch(excel_path, entries)}
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(_apply_entries_to_file, per_file_entries.items())
+        return dict(zip(per_file_entries, results))
+
+
+class PendingWrites:
+    def __init__(self, excel_path: str | Path, flush_every: int = 64):
+        self.excel_path = Path(excel_path)
+        self.wal_path = self.excel_path.with_name(self.excel_path.name + ".wal")
+        self.flush_every = flush_every
+        self.results: list[FormulaResult] = []
+        self._lock = threading.Lock()
+        self._entries: list[tuple[str, str, str]] = []
+
+    @classmethod
+    def recover(cls, excel_path: str | Path, flush_every: int = 64) -> "PendingWrites":
+        # Replays a WAL left behind by a crash before handing back a fresh
+        # instance. Replay is idempotent: entries that already reached the
+        # workbook are rewritten with the same formulas. The trailing newline
+        # is the record's commit marker, so a torn final line from a
+        # mid-write crash is skipped.
+        pending = cls(excel_path, flush_every=flush_every)
+        try:
+            with open(pending.wal_path, encoding="utf-8") as wal:
+                for line in wal:
+                    if not line.endswith("\n"):
+                        continue
+                    parts = line[:-1].split("\t", 2)
+                    if len(parts) == 3:
+                        pending._entries.append((parts[0], parts[1], parts[2]))
+        except FileNotFoundError:
+            return pending
+        pending.flush()
+        return pending
+
+    def add(self, sheet_name: str, cell_ref: str, formula: str) -> None:
+        with self._lock:
+            with open(self.wal_path, "a", encoding="utf-8") as wal:
+                wal.write(f"{sheet_name}\t{cell_ref}\t{formula}\n")
+            self._entries.append((sheet_name, cell_ref, formula))
+            if len(self._entries) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self) -> list[FormulaResult]:
+        with self._lock:
+            self._flush_locked()
+            return self.results
+
+    def _flush_locked(self) -> None:
+        if self._entries:
+            self.results.extend(write_formulas_bulk(self.excel_path, self._entries))
+            self._entries.clear()
+        self.wal_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "PendingWrites":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self.flush()
+        return False
+
+
+class FormulaBatch:
+    def __init__(self, excel_path: str | Path):
+        self.excel_path = Path(excel_path)
+        self.entries: list[tuple[str, str, str]] = []
+        self.results: list[FormulaResult] | None = None
+
+    def add(self, sheet_name: str, cell_ref: str, formula: str) -> None:
+        self.entries.append((sheet_name, cell_ref, formula))
+
+    def __enter__(self) -> "FormulaBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None and self.entries:
+            self.results = write_formulas_bulk(self.excel_path, self.entries)
+        return False
+
@@ -0,0 +1,401 @@
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Literal
+
+from loguru import logger
+from openpyxl import Workbook, load_workbook
+
+from dreamai.excel.errors import FileOperationError
+
+
+_RO_WB_CACHE_SIZE = 8
+_RO_WB_CACHE: dict[str, tuple[int, int, Any]] = {}
+
+
+def _get_ro_wb(excel_path: Path) -> Any:
+    # Metadata calls arrive back-to-back on the same file; re-parsing the zip
+    # each time dwarfs the actual lookup work. Keyed on (mtime_ns, size) so a
+    # rewritten file misses.
+    key = str(excel_path)
+    try:
+        st = os.stat(excel_path)
+    except FileNotFoundError:
+        raise FileOperationError(f"Excel file not found: {excel_path}")
+    cached = _RO_WB_CACHE.get(key)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    # Handles are closed when evicted or invalidated, not per call, so the
+    # cache stays warm between lookups.
+    wb = load_workbook(excel_path, read_only=True, data_only=True, keep_links=False)
+    if len(_RO_WB_CACHE) >= _RO_WB_CACHE_SIZE:
+        _RO_WB_CACHE.pop(next(iter(_RO_WB_CACHE)))[2].close()
+    _RO_WB_CACHE[key] = (st.st_mtime_ns, st.st_size, wb)
+    return wb
+
+
+def _invalidate_cached_wb(excel_path: Path) -> None:
+    cached = _RO_WB_CACHE.pop(str(excel_path), None)
+    if cached is not None:
+        cached[2].close()
+
+
+_INT_RE = re.compile(r"^-?\d+$")
+_FLOAT_RE = re.compile(r"^-?\d+\.\d+$")
+
+
+def _load_wb(excel_path: Path) -> Any:
+    # One open instead of an exists() stat followed by the open it races with.
+    try:
+        return load_workbook(excel_path)
+    except FileNotFoundError:
+        raise FileOperationError(f"Excel file not found: {excel_path}")
+
+
+def _coerce(value: str) -> Any:
+    # Two C-level matches replace the float() attempt plus exception
+    # unwinding that every non-numeric cell used to pay.
+    if _INT_RE.match(value):
+        return int(value)
+    if _FLOAT_RE.match(value):
+        return float(value)
+    return value
+
+
+_DELIMITERS = (",", ";", "\t", "|")
+
+
+def _detect_delimiter(sample: str) -> str:
+    # The winner is the candidate whose per-line count is most consistent
+    # (lowest variance), then most frequent — the csv.Sniffer heuristic
+    # without its per-character scans and backtracking-prone regexes.
+    lines = [line for line in sample.splitlines() if line]
+    if not lines:
+        return ","
+    best = ","
+    best_key: tuple[float, int] | None = None
+    for delimiter in _DELIMITERS:
+        counts = [line.count(delimiter) for line in lines]
+        total = sum(counts)
+        if total == 0:
+            continue
+        mean = total / len(counts)
+        variance = sum((count - mean) ** 2 for count in counts) / len(counts)
+        key = (-variance, total)
+        if best_key is None or key > best_key:
+            best_key = key
+            best = delimiter
+    return best
+
+
+def _detect_dialect_delimiter(csvfile: Any) -> str:
+    sample = csvfile.read(1024)
+    csvfile.seek(0)
+    return _detect_delimiter(sample)
+
+
+def _csv_rows(csv_path: Path, delimiter: str | None = None) -> list[list[Any]]:
+    with open(csv_path, newline="", encoding="utf-8") as csvfile:
+        if delimiter is None:
+            delimiter = _detect_dialect_delimiter(csvfile)
+        reader = csv.reader(csvfile, delimiter=delimiter)
+        return [[_coerce(value) if value else None for value in row] for row in reader]
+
+
+def csv_to_excel_sheet(
+    csv_path: str | Path,
+    excel_path: str | Path,
+    sheet_name: str | None = None,
+    delimiter: str | None = None,
+) -> str:
+    csv_path = Path(csv_path)
+    excel_path = Path(excel_path)
+    sheet_name = sheet_name or csv_path.stem
+    try:
+        rows = _csv_rows(csv_path, delimiter)
+    except FileNotFoundError:
+        raise FileOperationError(f"CSV file not found: {csv_path}")
+    if excel_path.exists():
+        # Existing workbooks can't use write_only mode; whole-row append still
+        # avoids the per-cell ws.cell() path.
+        wb = load_workbook(excel_path)
+        if sheet_name in wb.sheetnames:
+            del wb[sheet_name]
+        ws = wb.create_sheet(sheet_name)
+    else:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(sheet_name)
+    for row in rows:
+        ws.append(row)
+    wb.save(excel_path)
+    _invalidate_cached_wb(excel_path)
+    logger.info(f"Wrote {len(rows)} rows from {csv_path.name} to {excel_path}")
+    return str(excel_path)
+
+
+def _pyexcelerate_save(excel_path: Path, sheets: dict[str, list[list[Any]]]) -> bool:
+    # pyexcelerate is an optional install; bulk value writes bypass openpyxl's
+    # Cell graph entirely when it is available.
+    try:
+        from pyexcelerate import Workbook as PyexcelerateWorkbook
+    except ImportError:
+        return False
+    wb = PyexcelerateWorkbook()
+    for sheet_name, rows in sheets.items():
+        wb.new_sheet(sheet_name, data=rows)
+    wb.save(str(excel_path))
+    _invalidate_cached_wb(excel_path)
+    return True
+
+
+def csvs_to_excel(
+    csv_paths: list[str | Path],
+    excel_path: str | Path,
+    engine: Literal["openpyxl", "pyexcelerate"] = "pyexcelerate",
+    delimiter: str | list[str | None] | None = None,
+) -> str:
+    excel_path = Path(excel_path)
+    # One delimiter for every file, or a list parallel to csv_paths; None
+    # entries sniff as before.
+    delimiters = delimiter if isinstance(delimiter, list) else [delimiter] * len(csv_paths)
+    if len(delimiters) != len(csv_paths):
+        raise FileOperationError("delimiter list must match csv_paths in length")
+    paths = [Path(csv_path) for csv_path in csv_paths]
+    try:
+        if len(paths) > 1:
+            # Parsing and coercion are CPU-bound Python; the workers return
+            # plain lists, so nothing openpyxl-shaped crosses the process
+            # boundary.
+            with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as executor:
+                all_rows = list(executor.map(_csv_rows, paths, delimiters))
+        else:
+            all_rows = [_csv_rows(path, file_delimiter) for path, file_delimiter in zip(paths, delimiters)]
+    except FileNotFoundError as e:
+        raise FileOperationError(f"CSV file not found: {e.filename}")
+    sheets = {path.stem: rows for path, rows in zip(paths, all_rows)}
+    if engine == "pyexcelerate" and _pyexcelerate_save(excel_path, sheets):
+        logger.info(f"Wrote {len(csv_paths)} CSVs to {excel_path}")
+        return str(excel_path)
+    wb = Workbook(write_only=True)
+    for sheet_name, rows in sheets.items():
+        ws = wb.create_sheet(sheet_name)
+        for row in rows:
+            ws.append(row)
+    wb.save(excel_path)
+    _invalidate_cached_wb(excel_path)
+    logger.info(f"Wrote {len(csv_paths)} CSVs to {excel_path}")
+    return str(excel_path)
+
+
+def write_data_to_sheet(
+    excel_path: str | Path,
+    sheet_name: str,
+    data: list[list[Any]],
+    start_row: int = 1,
+    start_col: int = 1,
+    engine: Literal["openpyxl", "pyexcelerate"] = "pyexcelerate",
+) -> str:
+    excel_path = Path(excel_path)
+    # pyexcelerate writes whole workbooks, so it only applies to fresh files
+    # written from the origin cell; anything else edits in place via openpyxl.
+    if (
+        engine == "pyexcelerate"
+        and start_row == 1
+        and start_col == 1
+        and not excel_path.exists()
+        and _pyexcelerate_save(excel_path, {sheet_name: data})
+    ):
+        return str(excel_path)
+    if excel_path.exists():
+        wb = load_workbook(excel_path)
+        ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.create_sheet(sheet_name)
+    else:
+        wb = Workbook()
+        ws = wb.active
+        ws.title = sheet_name
+    if start_col == 1:
+        # Whole rows from column 1 go through append, which skips the
+        # per-cell coordinate bookkeeping; _current_row positions the cursor.
+        ws._current_row = start_row - 1
+        for row in data:
+            ws.append(list(row))
+    elif data:
+        # Touch the far corner once so the sheet's dimensions don't get
+        # re-extended on every single cell write.
+        ws.cell(row=start_row + len(data) - 1, column=start_col + max(map(len, data)) - 1)
+        for row_offset, row in enumerate(data):
+            for col_offset, value in enumerate(row):
+                ws.cell(row=start_row + row_offset, column=start_col + col_offset, value=value)
+    wb.save(excel_path)
+    _invalidate_cached_wb(excel_path)
+    return str(excel_path)
+
+
+def _read_file_bytes(file_path: Path) -> bytes:
+    with open(file_path, "rb") as fh:
+        return fh.read()
+
+
+def merge_excel_files(file_paths: list[str | Path], output_path: str | Path) -> str:
+    output_path = Path(output_path)
+    # Values stream straight from read-only sources into a write-only
+    # destination: no Cell objects are built and no A1 coordinate is parsed.
+    wb = Workbook(write_only=True)
+    seen_titles: set[str] = set()
+    source_paths = [Path(file_path) for file_path in file_paths]
+    # Overlap the cold-cache reads: the kernel serves all inputs at once while
+    # each workbook is still parsed (and merged) in submission order.
+    preloaded: dict[Path, bytes] = {}
+    try:
+        if len(source_paths) > 1:
+            with ThreadPoolExecutor(max_workers=min(4, len(source_paths))) as executor:
+                preloaded = dict(zip(source_paths, executor.map(_read_file_bytes, source_paths)))
+    except FileNotFoundError as e:
+        raise FileOperationError(f"Excel file not found: {e.filename}")
+    for file_path in source_paths:
+        data = preloaded.pop(file_path, None)
+        if data is not None:
+            source_wb = load_workbook(BytesIO(data), read_only=True, data_only=True)
+        else:
+            try:
+                source_wb = load_workbook(file_path, read_only=True, data_only=True)
+            except FileNotFoundError:
+                raise FileOperationError(f"Excel file not found: {file_path}")
+        try:
+            for source_name in source_wb.sheetnames:
+                source_sheet = source_wb[source_name]
+                title = source_name if source_name not in seen_titles else f"{file_path.stem}_{source_name}"
+                seen_titles.add(title)
+                new_sheet = wb.create_sheet(title)
+                for row in source_sheet.iter_rows(values_only=True):
+                    new_sheet.append(row)
+        finally:
+            source_wb.close()
+    wb.save(output_path)
+    _invalidate_cached_wb(output_path)
+    logger.info(f"Merged {len(file_paths)} files into {output_path}")
+    return str(output_path)
+
+
+def extract_sheet_to_csv(excel_path: str | Path, sheet_name: str, csv_path: str | Path | None = None) -> str:
+    excel_path = Path(excel_path)
+    wb = _get_ro_wb(excel_path)
+    if sheet_name not in wb.sheetnames:
+        raise FileOperationError(f"Sheet '{sheet_name}' not found. Available sheets: {wb.sheetnames}")
+    ws = wb[sheet_name]
+    csv_path = Path(csv_path) if csv_path is not None else excel_path.with_name(f"{sheet_name}.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8", buffering=1 << 20) as csvfile:
+        csv.writer(csvfile).writerows(
+            ("" if value is None else value for value in row) for row in ws.iter_rows(values_only=True)
+        )
+    return str(csv_path)
+
+
+def get_sheet_names(excel_path: str | Path) -> list[str]:
+    excel_path = Path(excel_path)
+    wb = _get_ro_wb(excel_path)
+    return list(wb.sheetnames)
+
+
+def _ws_bounds(ws: Any) -> tuple[int, int]:
+    # Write-only and pyexcelerate output carries no usable dimension record,
+    # so read-only sheets report None bounds; one streamed pass over the
+    # actual rows derives them. (calculate_dimension(force=True) would do the
+    # same but crashes on empty sheets.)
+    if ws.max_row is not None and ws.max_column is not None:
+        return ws.max_row, ws.max_column
+    ws.reset_dimensions()
+    max_row = max_col = 0
+    for row in ws.rows:
+        if not row:
+            continue
+        last = row[-1]
+        max_row = last.row
+        if last.column > max_col:
+            max_col = last.column
+    return max_row, max_col
+
+
+def get_spreadsheet_metadata(excel_path: str | Path) -> dict[str, Any]:
+    excel_path = Path(excel_path)
+    wb = _get_ro_wb(excel_path)
+    sheets = []
+    for sheet_name in wb.sheetnames:
+        ws = wb[sheet_name]
+        max_row, max_col = _ws_bounds(ws)
+        # One streamed pass over the sample window; random-access ws.cell()
+        # on a read-only sheet forces partial XML reads per call.
+        used_cells = 0
+        if max_row and max_col:
+            used_cells = sum(
+                1
+                for row in ws.iter_rows(max_row=min(100, max_row), max_col=min(26, max_col), values_only=True)
+                for value in row
+                if value is not None
+            )
+        sheets.append(
+            {
+                "name": sheet_name,
+                "max_row": max_row,
+                "max_column": max_col,
+                "cell_area": max_row * max_col,
+                "used_cells": used_cells,
+            }
+        )
+    return {"path": os.path.abspath(excel_path), "sheet_count": len(sheets), "sheets": sheets}
+
+
+def get_sheet_info(excel_path: str | Path, sheet_name: str) -> dict[str, Any]:
+    excel_path = Path(excel_path)
+    wb = _get_ro_wb(excel_path)
+    if sheet_name not in wb.sheetnames:
+        raise FileOperationError(f"Sheet '{sheet_name}' not found. Available sheets: {wb.sheetnames}")
+    ws = wb[sheet_name]
+    max_row, max_col = _ws_bounds(ws)
+    headers = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    return {
+        "name": sheet_name,
+        "max_row": max_row,
+        "max_column": max_col,
+        "headers": [header for header in headers if header is not None],
+    }
+
+
+def add_sheet(excel_path: str | Path, sheet_name: str) -> list[str]:
+    excel_path = Path(excel_path)
+    wb = _load_wb(excel_path)
+    if sheet_name in wb.sheetnames:
+        raise FileOperationError(f"Sheet '{sheet_name}' already exists")
+    wb.create_sheet(sheet_name)
+    wb.save(excel_path)
+    _invalidate_cached_wb(excel_path)
+    return list(wb.sheetnames)
+
+
+def rename_sheet(excel_path: str | Path, old_name: str, new_name: str) -> list[str]:
+    excel_path = Path(excel_path)
+    wb = _load_wb(excel_path)
+    if old_name not in wb.sheetnames:
+        raise FileOperationError(f"Sheet '{old_name}' not found. Available sheets: {wb.sheetnames}")
+    if new_name in wb.sheetnames:
+        raise FileOperationError(f"Sheet '{new_name}' already exists")
+    wb[old_name].title = new_name
+    wb.save(excel_path)
+    _invalidate_cached_wb(excel_path)
+    return list(wb.sheetnames)
+
+
+def delete_sheet(excel_path: str | Path, sheet_name: str) -> list[str]:
+    excel_path = Path(excel_path)
+    wb = _load_wb(excel_path)
+    if sheet_name not in wb.sheetnames:
+        raise FileOperationError(f"Sheet '{sheet_name}' not found. Available sheets: {wb.sheetnames}")
+    if len(wb.sheetnames) == 1:
+        raise FileOperationError("Cannot delete the only sheet in a workbook")
+    del wb[sheet_name]
+    wb.save(excel_path)
+    _invalidate_cached_wb(excel_path)
+    return list(wb.sheetnames)
@@ -0,0 +1,444 @@
+import functools
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import formulas
+
+# The write path is API-compatible with wolfxl's Rust-backed load_workbook;
+# opt out with DREAMAI_EXCEL_BACKEND=openpyxl.
+if os.environ.get("DREAMAI_EXCEL_BACKEND", "wolfxl") == "openpyxl":
+    from openpyxl import load_workbook
+else:
+    try:
+        from wolfxl import load_workbook
+    except ImportError:
+        from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+from python_calamine import CalamineWorkbook
+
+from dreamai.excel.errors import FileOperationError, FormulaError
+from dreamai.excel.formulas import MAX_COLS, MAX_ROWS, FormulaResult, _buffered_save
+
+
+_CWB_CACHE_SIZE = 8
+_CWB_CACHE: dict[str, tuple[int, CalamineWorkbook]] = {}
+
+
+def _get_cwb(excel_path: str | Path) -> CalamineWorkbook:
+    key = str(excel_path)
+    mtime = os.stat(excel_path).st_mtime_ns
+    cached = _CWB_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    cwb = CalamineWorkbook.from_path(key)
+    if len(_CWB_CACHE) >= _CWB_CACHE_SIZE:
+        _CWB_CACHE.pop(next(iter(_CWB_CACHE)))
+    _CWB_CACHE[key] = (mtime, cwb)
+    return cwb
+
+
+def _load_sheet_rows(excel_path: str, sheet: str) -> list[list[Any]]:
+    # Each worker opens its own handle; a shared CalamineWorkbook is not
+    # guaranteed thread-safe. skip_empty_area must stay off: trimming leading
+    # empty rows/columns would unanchor the grid from A1 and shift every
+    # coordinate fed to the model.
+    cwb = CalamineWorkbook.from_path(excel_path)
+    return cwb.get_sheet_by_name(sheet).to_python(skip_empty_area=False)
+
+
+def _load_sheets_rows(
+    excel_path: str | Path, cwb: CalamineWorkbook, sheets: list[str]
+) -> dict[str, list[list[Any]]]:
+    # Single-sheet loads reuse the cached handle; the thread pool only pays
+    # off once there is more than one sheet to parse.
+    if len(sheets) > 1:
+        with ThreadPoolExecutor(max_workers=min(4, len(sheets))) as ex:
+            futures = {sheet: ex.submit(_load_sheet_rows, str(excel_path), sheet) for sheet in sheets}
+            return {sheet: future.result() for sheet, future in futures.items()}
+    return {sheet: cwb.get_sheet_by_name(sheet).to_python(skip_empty_area=False) for sheet in sheets}
+
+
+_VALID_EXCEL_FUNCTIONS = frozenset(
+    {
+        "ABS",
+        "ACCRINT",
+        "ACOS",
+        "ADDRESS",
+        "AGGREGATE",
+        "AND",
+        "ASIN",
+        "ATAN",
+        "ATAN2",
+        "AVERAGE",
+        "AVERAGEA",
+        "AVERAGEIF",
+        "AVERAGEIFS",
+        "CEILING",
+        "CELL",
+        "CHAR",
+        "CHOOSE",
+        "CLEAN",
+        "CODE",
+        "COLUMN",
+        "COLUMNS",
+        "CONCAT",
+        "CONCATENATE",
+        "COS",
+        "COUNT",
+        "COUNTA",
+        "COUNTBLANK",
+        "COUNTIF",
+        "COUNTIFS",
+        "DATE",
+        "DATEDIF",
+        "DATEVALUE",
+        "DAY",
+        "DAYS",
+        "DB",
+        "DDB",
+        "DEGREES",
+        "EDATE",
+        "EOMONTH",
+        "EXACT",
+        "EXP",
+        "FILTER",
+        "FIND",
+        "FLOOR",
+        "FORECAST",
+        "FV",
+        "HLOOKUP",
+        "HOUR",
+        "IF",
+        "IFERROR",
+        "IFNA",
+        "IFS",
+        "INDEX",
+        "INDIRECT",
+        "INT",
+        "IPMT",
+        "IRR",
+        "ISBLANK",
+        "ISERR",
+        "ISERROR",
+        "ISEVEN",
+        "ISLOGICAL",
+        "ISNA",
+        "ISNONTEXT",
+        "ISNUMBER",
+        "ISODD",
+        "ISREF",
+        "ISTEXT",
+        "LARGE",
+        "LEFT",
+        "LEN",
+        "LET",
+        "LN",
+        "LOG",
+        "LOG10",
+        "LOOKUP",
+        "LOWER",
+        "MATCH",
+        "MAX",
+        "MAXIFS",
+        "MEDIAN",
+        "MID",
+        "MIN",
+        "MINIFS",
+        "MINUTE",
+        "MOD",
+        "MODE",
+        "MONTH",
+        "N",
+        "NA",
+        "NETWORKDAYS",
+        "NOT",
+        "NOW",
+        "NPER",
+        "NPV",
+        "OFFSET",
+        "OR",
+        "PERCENTILE",
+        "PI",
+        "PMT",
+        "POWER",
+        "PPMT",
+        "PRODUCT",
+        "PROPER",
+        "PV",
+        "QUARTILE",
+        "RADIANS",
+        "RAND",
+        "RANDBETWEEN",
+        "RANK",
+        "RATE",
+        "REPLACE",
+        "REPT",
+        "RIGHT",
+        "ROUND",
+        "ROUNDDOWN",
+        "ROUNDUP",
+        "ROW",
+        "ROWS",
+        "SEARCH",
+        "SECOND",
+        "SEQUENCE",
+        "SIGN",
+        "SIN",
+        "SLN",
+        "SMALL",
+        "SORT",
+        "SQRT",
+        "STDEV",
+        "SUBSTITUTE",
+        "SUM",
+        "SUMIF",
+        "SUMIFS",
+        "SUMPRODUCT",
+        "SWITCH",
+        "SYD",
+        "TAN",
+        "TEXT",
+        "TEXTJOIN",
+        "TIME",
+        "TODAY",
+        "TRANSPOSE",
+        "TRIM",
+        "TRUNC",
+        "UNIQUE",
+        "UPPER",
+        "VALUE",
+        "VAR",
+        "VLOOKUP",
+        "WEEKDAY",
+        "WORKDAY",
+        "XLOOKUP",
+        "XMATCH",
+        "YEAR",
+        "YEARFRAC",
+    }
+)
+
+_STRING_RE = re.compile(r'"[^"]*"')
+_SHEET_REF_RE = re.compile(r"(?:'([^']+)'|([A-Za-z_][\w\s]*))!")
+_FUNC_RE = re.compile(r"\b([A-Z][A-Z0-9]*)\s*\(")
+_REJECT_RE = re.compile(r"(?P<dotref>\b[A-Za-z_][\w\s]*\.[A-Z]{1,3}\d{1,7}\b)|(?P<div0>/\s*0(?![\d.]))")
+_TOKEN_RE = re.compile(
+    r'(?P<string>"[^"]*")'
+    r"|(?P<sheetref>'[^']+'|[A-Za-z_][\w\s]*)!"
+    r"|(?P<func>[A-Z][A-Z0-9]*)(?=\s*\()"
+    r"|(?<![A-Za-z0-9_])(?P<col>[A-Z]{1,3})(?P<row>\d{1,7})\b",
+    re.IGNORECASE,
+)
+_CELL_BOUNDS_RE = re.compile(r"\b([A-Z]{1,3})(\d{1,7})\b")
+_COL_TO_NUM: dict[str, int] = {get_column_letter(i): i for i in range(1, MAX_COLS + 1)}
+_SUGGESTIONS: dict[str, list[str]] = {}
+for _name in sorted(_VALID_EXCEL_FUNCTIONS):
+    _SUGGESTIONS.setdefault(_name[:2], []).append(_name)
+
+# Parser builds its token tables once and is immutable afterwards, so one
+# instance serves every call.
+_FORMULA_PARSER = formulas.Parser()
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_error(formula: str) -> str | None:
+    try:
+        _FORMULA_PARSER.ast(formula)
+    except Exception as e:
+        return f"Formula failed to parse: {e}"
+    return None
+
+
+@functools.lru_cache(maxsize=64)
+def _sheet_dot_re(sheets: tuple[str, ...]) -> re.Pattern[str]:
+    return re.compile(r"\b(" + "|".join(map(re.escape, sheets)) + r")\.")
+
+
+@functools.lru_cache(maxsize=4096)
+def _validation_error(
+    path: str, mtime_ns: int, size: int, sheet_name: str, cell_ref: str, formula: str
+) -> str | None:
+    try:
+        _validate_formula_impl(path, sheet_name, cell_ref, formula)
+    except FormulaError as e:
+        return str(e)
+    return None
+
+
+def _validate_formula(excel_path: str | Path, sheet_name: str, cell_ref: str, formula: str) -> None:
+    st = os.stat(excel_path)
+    error = _validation_error(
+        os.path.abspath(str(excel_path)), st.st_mtime_ns, st.st_size, sheet_name, cell_ref, formula
+    )
+    if error is not None:
+        raise FormulaError(error)
+
+
+def _validate_static(formula: str, available_sheets: list[str]) -> None:
+    # Quoted literals may legally contain '.' sheet-style text or "/0", so
+    # the pre-scans run on a masked copy, mirroring how the token pass
+    # consumes strings.
+    scan_target = _STRING_RE.sub('""', formula) if '"' in formula else formula
+    # One scan rejects both OpenOffice '.' separators and literal division
+    # by zero.
+    reject = _REJECT_RE.search(scan_target)
+    if reject:
+        if reject.lastgroup == "dotref":
+            raise FormulaError("Sheet references must use '!', not '.'")
+        raise FormulaError("Formula divides by zero. Wrap it in IFERROR(...) if that is intended")
+
+    # Catch '.' separators that use a real sheet name.
+    dot_match = _sheet_dot_re(tuple(available_sheets)).search(scan_target)
+    if dot_match:
+        sheet = dot_match.group(1)
+        raise FormulaError(f"Reference '{sheet}.' uses '.', write '{sheet}!' instead")
+
+    # Sheet references, function names and cell bounds all come from one
+    # token stream; string literals are consumed so their contents are not
+    # mistaken for references.
+    for match in _TOKEN_RE.finditer(formula):
+        kind = match.lastgroup
+        if kind == "string":
+            continue
+        if kind == "sheetref":
+            ref_sheet = match.group("sheetref")
+            if ref_sheet[0] == "'":
+                ref_sheet = ref_sheet[1:-1]
+            ref_sheet = ref_sheet.strip()
+            if ref_sheet not in available_sheets:
+                raise FormulaError(f"Sheet '{ref_sheet}' not found. Available sheets: {available_sheets}")
+        elif kind == "func":
+            func_name = match.group("func")
+            if not func_name.isupper():
+                func_name = func_name.upper()
+            if func_name not in _VALID_EXCEL_FUNCTIONS:
+                suggestions = _SUGGESTIONS.get(func_name[:2], [])[:5]
+                raise FormulaError(f"Unknown function '{func_name}'. Did you mean one of {suggestions}?")
+        else:
+            col_letters = match.group("col")
+            if not col_letters.isupper():
+                col_letters = col_letters.upper()
+            row_digits = match.group("row")
+            if col_letters not in _COL_TO_NUM or int(row_digits) > MAX_ROWS:
+                raise FormulaError(
+                    f"Cell reference '{col_letters}{row_digits}' is outside worksheet bounds"
+                )
+
+
+def _validate_formula_impl(excel_path: str | Path, sheet_name: str, cell_ref: str, formula: str) -> None:
+    cwb = _get_cwb(excel_path)
+    available_sheets = list(cwb.sheet_names)
+
+    _validate_static(formula, available_sheets)
+
+    # Step 6: evaluate the formula against the workbook's data.
+    parse_error = _parse_error(formula)
+    if parse_error is not None:
+        raise FormulaError(parse_error)
+    # Self-contained formulas (no cell or sheet references, e.g. =SUM(1,2,3))
+    # are fully covered by the parse and the static steps — skip the data load
+    # and evaluation entirely.
+    if not (_CELL_BOUNDS_RE.search(formula.upper()) or _SHEET_REF_RE.search(formula)):
+        return
+    needed_sheets = {sheet_name}
+    for match in _SHEET_REF_RE.finditer(formula):
+        needed_sheets.add((match.group(1) or match.group(2)).strip())
+    sheets_rows = _load_sheets_rows(excel_path, cwb, [s for s in available_sheets if s in needed_sheets])
+    # from_dict is ExcelModel's bulk-load entry point: one flat dict of fully
+    # qualified "'[book]Sheet'!A1" references. A fresh model per call, since
+    # ExcelModel accumulates cells and has no public reset.
+    book = Path(excel_path).name
+    cells: dict[str, Any] = {}
+    for sheet, rows in sheets_rows.items():
+        ref_prefix = f"'[{book}]{sheet}'!"
+        is_target_sheet = sheet == sheet_name
+        for ridx, row in enumerate(rows, start=1):
+            for cidx, value in enumerate(row, start=1):
+                if value is None or value == "":
+                    continue
+                cell_addr = f"{get_column_letter(cidx)}{ridx}"
+                if is_target_sheet and cell_addr == cell_ref:
+                    continue
+                cells[ref_prefix + cell_addr] = value
+    cells[f"'[{book}]{sheet_name}'!{cell_ref}"] = formula
+    # Solution keys uppercase the sheet and cell but keep the book's case.
+    output_ref = f"'[{book}]{sheet_name.upper()}'!{cell_ref.upper()}"
+    try:
+        xl_model = formulas.ExcelModel().from_dict(cells)
+        result = xl_model.calculate(outputs=[output_ref])
+        value = result[output_ref].value[0, 0]
+    except FormulaError:
+        raise
+    except Exception as e:
+        raise FormulaError(f"Formula evaluation failed: {e}")
+    # XlError subclasses str, so error cells ("#DIV/0!", "#NAME?") land here.
+    if isinstance(value, str) and value.startswith("#"):
+        raise FormulaError(f"Formula evaluates to {value}")
+
+
+def _write_formula(
+    excel_path: Path, sheet_name: str, cell_ref: str, formula: str, wb: Any = None
+) -> None:
+    if wb is None:
+        wb = load_workbook(excel_path)
+    if sheet_name not in wb.sheetnames:
+        raise FormulaError(f"Sheet '{sheet_name}' not found. Available sheets: {wb.sheetnames}")
+    wb[sheet_name][cell_ref] = formula
+    _buffered_save(wb, excel_path)
+
+
+def write_validated_formula(
+    excel_path: str | Path, sheet_name: str, cell_ref: str, formula: str
+) -> FormulaResult:
+    excel_path = Path(excel_path)
+    if not excel_path.exists():
+        raise FileOperationError(f"Excel file not found: {excel_path}")
+    # Single owner of the "=" prefix: everything downstream gets a
+    # normalized formula.
+    if not formula.startswith("="):
+        formula = "=" + formula
+    try:
+        _validate_formula(excel_path, sheet_name, cell_ref, formula)
+        _write_formula(excel_path, sheet_name, cell_ref, formula)
+    except FormulaError:
+        raise
+    except Exception as e:
+        raise FileOperationError(f"Failed to write formula: {e}")
+    return FormulaResult(True, None, None, formula)
+
+
+def _entry_order(entry: tuple[str, str, str]) -> tuple[str, int, int]:
+    sheet_name, cell_ref, _ = entry
+    match = re.match(r"([A-Z]{1,3})(\d+)", cell_ref.upper())
+    if match is None:
+        return (sheet_name, 1 << 30, 0)
+    return (sheet_name, int(match.group(2)), _COL_TO_NUM.get(match.group(1), 0))
+
+
+def write_formulas_batch(
+    excel_path: str | Path, entries: list[tuple[str, str, str]]
+) -> list[FormulaResult]:
+    excel_path = Path(excel_path)
+    if not excel_path.exists():
+        raise FileOperationError(f"Excel file not found: {excel_path}")
+    normalized = [
+        (sheet_name, cell_ref, formula if formula.startswith("=") else "=" + formula)
+        for sheet_name, cell_ref, formula in entries
+    ]
+    for sheet_name, cell_ref, formula in normalized:
+        _validate_formula(excel_path, sheet_name, cell_ref, formula)
+    try:
+        wb = load_workbook(excel_path)
+        for sheet_name, cell_ref, formula in sorted(normalized, key=_entry_order):
+            if sheet_name not in wb.sheetnames:
+                raise FormulaError(f"Sheet '{sheet_name}' not found. Available sheets: {wb.sheetnames}")
+            wb[sheet_name][cell_ref] = formula
+        _buffered_save(wb, excel_path)
+    except FormulaError:
+        raise
+    except Exception as e:
+        raise FileOperationError(f"Failed to write formulas: {e}")
+    return [FormulaResult(True, None, None, formula) for _, _, formula in normalized]